@@ -32,5 +32,5 @@ setup(
     entry_points={
         "console_scripts": ["dirhash=dirhash.cli:main"],
     },
-    tests_require=["pre-commit", "pytest", "pytest-cov"],
+    tests_require=["pre-commit", "pytest", "pytest-cov", "pytest-xdist"],
 )
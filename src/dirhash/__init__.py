@@ -3,7 +3,8 @@
 
 import hashlib
 import os
-from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
 from multiprocessing import Pool
 
 from scantree import CyclicLinkedDir, RecursionFilter, scantree
@@ -41,6 +42,7 @@ def dirhash(
     allow_cyclic_links=False,
     chunk_size=2**20,
     jobs=1,
+    executor=None,
 ):
     """Computes the hash of a directory based on its structure and content.
 
@@ -86,6 +88,14 @@ def dirhash(
             that using multiprocessing can significantly speed-up execution, see
             `https://github.com/andhus/dirhash-python/benchmark` for further
             details.
+        executor: Optional[concurrent.futures.Executor] - An executor, e.g. a
+            `concurrent.futures.ProcessPoolExecutor`, to use for hashing files in
+            parallel instead of starting a new pool of `jobs` processes (`jobs` is
+            then ignored). This allows for reusing the same pool of workers across
+            multiple calls. A `concurrent.futures.ThreadPoolExecutor` can also be
+            used, which avoids the overhead of starting processes and pickling
+            arguments (`hashlib` releases the GIL while hashing larger chunks, so
+            threads still hash files in parallel). Default `None`.
 
     # Returns
         str - The hash/checksum as a string of the hexadecimal digits (the result of
@@ -157,11 +167,18 @@ def dirhash(
         protocol=protocol,
         chunk_size=chunk_size,
         jobs=jobs,
+        executor=executor,
     )
 
 
 def dirhash_impl(
-    directory, algorithm, filter_=None, protocol=None, chunk_size=2**20, jobs=1
+    directory,
+    algorithm,
+    filter_=None,
+    protocol=None,
+    chunk_size=2**20,
+    jobs=1,
+    executor=None,
 ):
     """Computes the hash of a directory based on its structure and content.
 
@@ -187,6 +204,10 @@ def dirhash_impl(
             that using multiprocessing can significantly speed-up execution, see
             `https://github.com/andhus/dirhash/tree/master/benchmark` for further
             details.
+        executor: Optional[concurrent.futures.Executor] - An executor, e.g. a
+            `concurrent.futures.ProcessPoolExecutor`, to use for hashing files in
+            parallel instead of starting a new pool of `jobs` processes (`jobs` is
+            then ignored). Default `None`.
 
     # Returns
         str - The hash/checksum as a string of the hexadecimal digits (the result of
@@ -226,7 +247,7 @@ def dirhash_impl(
 
         return dir_node.path, _dirhash
 
-    if jobs == 1:
+    if jobs == 1 and executor is None:
         cache = {}
 
         def file_apply(path):
@@ -270,6 +291,7 @@ def dirhash_impl(
             ),
             real_paths,
             jobs=jobs,
+            executor=executor,
         )
         # prepare the mapping with precomputed file hashes
         real_path_to_hash = dict(zip(real_paths, file_hashes))
@@ -526,11 +548,8 @@ def _get_hasher_factory(algorithm):
     name. Bypasses input argument `algorithm` if it is already a hasher factory
     (verified by attempting calls to required methods).
     """
-    if algorithm in algorithms_guaranteed:
-        return getattr(hashlib, algorithm)
-
-    if algorithm in algorithms_available:
-        return partial(hashlib.new, algorithm)
+    if algorithm in algorithms_guaranteed or algorithm in algorithms_available:
+        return _get_named_hasher_factory(algorithm)
 
     try:  # bypass algorithm if already a hasher factory
         hasher = algorithm(b"")
@@ -543,8 +562,34 @@ def _get_hasher_factory(algorithm):
     raise ValueError(f"`algorithm` must be one of: {algorithms_available}`")
 
 
-def _parmap(func, iterable, jobs=1):
-    """Map with multiprocessing.Pool"""
+@lru_cache(maxsize=None)
+def _get_named_hasher_factory(algorithm):
+    """Returns the (memoized) hasher factory for an available algorithm name. The
+    named constructor of `hashlib` is used if there is one, since `hashlib.new`
+    resolves the algorithm by name on every call.
+    """
+    hasher_factory = getattr(hashlib, algorithm, None)
+    if hasher_factory is None:
+        hasher_factory = partial(hashlib.new, algorithm)
+
+    return hasher_factory
+
+
+def _parmap(func, iterable, jobs=1, executor=None):
+    """Map with multiprocessing.Pool, or with `executor` if provided"""
+    if isinstance(executor, ProcessPoolExecutor):
+        # as `Pool.map`, send the work to the worker processes in about 4 chunks per
+        # worker to reduce the communication overhead. NOTE: the number of workers
+        # is not part of the `Executor` interface, this relies on the (CPython
+        # implementation detail) `_max_workers` attribute.
+        iterable = list(iterable)
+        chunksize, extra = divmod(len(iterable), 4 * executor._max_workers)
+        chunksize = max(1, chunksize + bool(extra))
+        return list(executor.map(func, iterable, chunksize=chunksize))
+
+    if executor is not None:  # `chunksize` has no effect for other executors
+        return list(executor.map(func, iterable))
+
     if jobs == 1:
         return [func(element) for element in iterable]
 
@@ -1,11 +1,11 @@
 import hashlib
+import multiprocessing
 import os
-import shutil
-import tempfile
-from time import sleep, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from time import perf_counter_ns, sleep
 
 import pytest
-from scantree import SymlinkRecursionError
 
 from dirhash import (
     Filter,
@@ -32,37 +32,62 @@ def map_osp(paths):
     return [osp(path) for path in paths]
 
 
+# sorted, for a deterministic order of parametrized tests (e.g. across xdist workers)
+ALGORITHMS_AVAILABLE = tuple(sorted(algorithms_available))
+
+
 class TestGetHasherFactory:
-    def test_get_guaranteed(self):
-        algorithm_and_hasher_factory = [
+    def test_algorithms_guaranteed(self):
+        assert algorithms_guaranteed == {
+            "md5",
+            "sha1",
+            "sha224",
+            "sha256",
+            "sha384",
+            "sha512",
+        }
+
+    @pytest.mark.parametrize(
+        "algorithm, expected_hasher_factory",
+        [
             ("md5", hashlib.md5),
             ("sha1", hashlib.sha1),
             ("sha224", hashlib.sha224),
             ("sha256", hashlib.sha256),
             ("sha384", hashlib.sha384),
             ("sha512", hashlib.sha512),
-        ]
-        assert algorithms_guaranteed == {a for a, _ in algorithm_and_hasher_factory}
-        for algorithm, expected_hasher_factory in algorithm_and_hasher_factory:
-            hasher_factory = _get_hasher_factory(algorithm)
-            assert hasher_factory == expected_hasher_factory
-
-    def test_get_available(self):
-        for algorithm in algorithms_available:
-            hasher_factory = _get_hasher_factory(algorithm)
-            try:
-                hasher = hasher_factory()
-            except ValueError as exc:
-                # Some "available" algorithms are not necessarily available
-                # (fails for e.g. 'ripemd160' in github actions for python 3.8).
-                # See: https://stackoverflow.com/questions/72409563/unsupported-hash-type-ripemd160-with-hashlib-in-python  # noqa: E501
-                print(f"Failed to create hasher for {algorithm}: {exc}")
-                assert exc.args[0] == f"unsupported hash type {algorithm}"
-                hasher = None
-
-            if hasher is not None:
-                assert hasattr(hasher, "update")
-                assert hasattr(hasher, "hexdigest")
+        ],
+    )
+    def test_get_guaranteed(self, algorithm, expected_hasher_factory):
+        hasher_factory = _get_hasher_factory(algorithm)
+        assert hasher_factory == expected_hasher_factory
+
+    @pytest.mark.parametrize("algorithm", ALGORITHMS_AVAILABLE)
+    def test_get_available(self, algorithm):
+        hasher_factory = _get_hasher_factory(algorithm)
+        if hasattr(hashlib, algorithm):
+            assert hasher_factory is getattr(hashlib, algorithm)
+        try:
+            hasher = hasher_factory()
+        except ValueError as exc:
+            # Some "available" algorithms are not necessarily available
+            # (fails for e.g. 'ripemd160' in github actions for python 3.8).
+            # See: https://stackoverflow.com/questions/72409563/unsupported-hash-type-ripemd160-with-hashlib-in-python  # noqa: E501
+            print(f"Failed to create hasher for {algorithm}: {exc}")
+            assert exc.args[0] == f"unsupported hash type {algorithm}"
+            hasher = None
+
+        if hasher is not None:
+            assert hasattr(hasher, "update")
+            assert hasattr(hasher, "hexdigest")
+
+    # algorithms that are attributes of `hashlib` are returned as is, memoization
+    # only matters for those created by `hashlib.new`
+    @pytest.mark.parametrize(
+        "algorithm", [a for a in ALGORITHMS_AVAILABLE if not hasattr(hashlib, a)]
+    )
+    def test_memoized(self, algorithm):
+        assert _get_hasher_factory(algorithm) is _get_hasher_factory(algorithm)
 
     def test_not_available(self):
         with pytest.raises(ValueError):
@@ -144,45 +169,59 @@ class TestGetMatchPatterns:
         assert ms == ["*", "!*.ext"]
 
 
-class TempDirTest:
-    def setup_method(self):
-        self.dir = tempfile.mkdtemp()
+def make_tree(root, spec):
+    """Create the files in `spec`, a mapping from path relative to `root` to
+    content, and their parent directories."""
+    for dirpath in {os.path.dirname(osp(relpath)) for relpath in spec}:
+        os.makedirs(os.path.join(root, dirpath), exist_ok=True)
+    for relpath, content in spec.items():
+        with open(os.path.join(root, osp(relpath)), "wb") as f:
+            f.write(content)
 
-    def teardown_method(self):
-        if os.path.exists(self.dir):
-            shutil.rmtree(self.dir)
+
+class TempDirTest:
+    @pytest.fixture(autouse=True)
+    def _setup_dir(self, tmp_path):
+        self.dir = str(tmp_path)
 
     def path_to(self, relpath):
-        return os.path.join(self.dir, osp(relpath))
+        return self.dir + os.sep + osp(relpath)
 
     def mkdirs(self, dirpath):
         os.makedirs(self.path_to(dirpath))
 
-    def mkfile(self, relpath, content=None):
-        with open(self.path_to(relpath), "w") as f:
-            if content:
-                f.write(content)
+    def mkfile(self, relpath, content=b""):
+        with open(self.path_to(relpath), "wb") as f:
+            f.write(content)
+
+    def mkfiles(self, spec):
+        make_tree(self.dir, spec)
 
     def symlink(self, src, dst):
         os.symlink(self.path_to(src), self.path_to(dst))
 
-    def remove(self, relpath):
-        if os.path.isdir(self.path_to(relpath)):
-            shutil.rmtree(self.path_to(relpath))
-        os.remove(self.path_to(relpath))
+
+@pytest.fixture(scope="module")
+def hidden_tree(tmp_path_factory):
+    """A (read-only) tree with hidden files and directories at different levels."""
+    root = str(tmp_path_factory.mktemp("hidden") / "root")
+    make_tree(root, dict.fromkeys(["f1", ".f2", "d1/f1", "d1/.f2", ".d2/f1"], b""))
+
+    return root
 
 
 class TestGetIncludedPaths(TempDirTest):
     # Integration tests with `pathspec` for basic use cases.
 
     def test_basic(self):
-        self.mkdirs("root/d1/d11")
-        self.mkdirs("root/d2")
-
-        self.mkfile("root/f1")
-        self.mkfile("root/d1/f1")
-        self.mkfile("root/d1/d11/f1")
-        self.mkfile("root/d2/f1")
+        self.mkfiles(
+            {
+                "root/f1": b"",
+                "root/d1/f1": b"",
+                "root/d1/d11/f1": b"",
+                "root/d2/f1": b"",
+            }
+        )
 
         expected_filepaths = map_osp(["d1/d11/f1", "d1/f1", "d2/f1", "f1"])
         filepaths = included_paths(self.path_to("root"))
@@ -202,125 +241,96 @@ class TestGetIncludedPaths(TempDirTest):
             included_paths(self.path_to("root/f1"))
 
     def test_symlinked_file(self):
-        self.mkdirs("root")
-        self.mkfile("root/f1")
-        self.mkfile("linked_file")
+        root = self.path_to("root")
+        self.mkfiles({"root/f1": b"", "linked_file": b""})
         self.symlink("linked_file", "root/f2")
 
-        filepaths = included_paths(self.path_to("root"), linked_files=True)
+        filepaths = included_paths(root, linked_files=True)
         assert filepaths == ["f1", "f2"]
 
-        filepaths = included_paths(self.path_to("root"), linked_files=False)
+        filepaths = included_paths(root, linked_files=False)
         assert filepaths == ["f1"]
 
         # default is 'linked_files': True
-        filepaths = included_paths(
-            self.path_to("root"),
-        )
+        filepaths = included_paths(root)
         assert filepaths == ["f1", "f2"]
 
     def test_symlinked_dir(self):
-        self.mkdirs("root")
-        self.mkfile("root/f1")
-        self.mkdirs("linked_dir")
-        self.mkfile("linked_dir/f1")
-        self.mkfile("linked_dir/f2")
+        root = self.path_to("root")
+        self.mkfiles({"root/f1": b"", "linked_dir/f1": b"", "linked_dir/f2": b""})
         self.symlink("linked_dir", "root/d1")
 
-        filepaths = included_paths(self.path_to("root"), linked_dirs=False)
+        filepaths = included_paths(root, linked_dirs=False)
         assert filepaths == ["f1"]
 
-        filepaths = included_paths(self.path_to("root"), linked_dirs=True)
+        filepaths = included_paths(root, linked_dirs=True)
         assert filepaths == map_osp(["d1/f1", "d1/f2", "f1"])
 
         # default is 'linked_dirs': True
-        filepaths = included_paths(self.path_to("root"))
+        filepaths = included_paths(root)
         assert filepaths == map_osp(["d1/f1", "d1/f2", "f1"])
 
     def test_cyclic_link(self):
+        from scantree import SymlinkRecursionError
+
+        root = self.path_to("root")
         self.mkdirs("root/d1")
         self.symlink("root", "root/d1/link_back")
         with pytest.raises(SymlinkRecursionError) as exc_info:
-            included_paths(self.path_to("root"), allow_cyclic_links=False)
-        assert exc_info.value.real_path == os.path.realpath(self.path_to("root"))
+            included_paths(root, allow_cyclic_links=False)
+        assert exc_info.value.real_path == os.path.realpath(root)
         assert exc_info.value.first_path == self.path_to("root/")
         assert exc_info.value.second_path == self.path_to("root/d1/link_back")
         assert str(exc_info.value).startswith("Symlink recursion:")
 
-        filepaths = included_paths(self.path_to("root"), allow_cyclic_links=True)
+        filepaths = included_paths(root, allow_cyclic_links=True)
         assert filepaths == map_osp(["d1/link_back/."])
 
         # default is 'allow_cyclic_links': False
         with pytest.raises(SymlinkRecursionError):
-            filepaths = included_paths(self.path_to("root"))
-
-    def test_ignore_hidden(self):
-        self.mkdirs("root/d1")
-        self.mkdirs("root/.d2")
-
-        self.mkfile("root/f1")
-        self.mkfile("root/.f2")
-        self.mkfile("root/d1/f1")
-        self.mkfile("root/d1/.f2")
-        self.mkfile("root/.d2/f1")
+            filepaths = included_paths(root)
 
+    def test_ignore_hidden(self, hidden_tree):
         # no ignore
-        filepaths = included_paths(self.path_to("root"))
+        filepaths = included_paths(hidden_tree)
         assert filepaths == map_osp([".d2/f1", ".f2", "d1/.f2", "d1/f1", "f1"])
 
         # with ignore
-        filepaths = included_paths(self.path_to("root"), match=["*", "!.*"])
+        filepaths = included_paths(hidden_tree, match=["*", "!.*"])
         assert filepaths == map_osp(["d1/f1", "f1"])
 
-    def test_ignore_hidden_files_only(self):
-        self.mkdirs("root/d1")
-        self.mkdirs("root/.d2")
-
-        self.mkfile("root/f1")
-        self.mkfile("root/.f2")
-        self.mkfile("root/d1/f1")
-        self.mkfile("root/d1/.f2")
-        self.mkfile("root/.d2/f1")
-
+    def test_ignore_hidden_files_only(self, hidden_tree):
         # no ignore
-        filepaths = included_paths(self.path_to("root"))
+        filepaths = included_paths(hidden_tree)
         assert filepaths == map_osp([".d2/f1", ".f2", "d1/.f2", "d1/f1", "f1"])
 
         # with ignore
         filepaths = included_paths(
-            self.path_to("root"), match=["**/*", "!**/.*", "**/.*/*", "!**/.*/.*"]
+            hidden_tree, match=["**/*", "!**/.*", "**/.*/*", "!**/.*/.*"]
         )
         assert filepaths == map_osp([".d2/f1", "d1/f1", "f1"])
 
-    def test_ignore_hidden_explicitly_recursive(self):
-        self.mkdirs("root/d1")
-        self.mkdirs("root/.d2")
-
-        self.mkfile("root/f1")
-        self.mkfile("root/.f2")
-        self.mkfile("root/d1/f1")
-        self.mkfile("root/d1/.f2")
-        self.mkfile("root/.d2/f1")
-
+    def test_ignore_hidden_explicitly_recursive(self, hidden_tree):
         # no ignore
-        filepaths = included_paths(self.path_to("root"))
+        filepaths = included_paths(hidden_tree)
         assert filepaths == map_osp([".d2/f1", ".f2", "d1/.f2", "d1/f1", "f1"])
 
         # with ignore
-        filepaths = included_paths(self.path_to("root"), match=["*", "!**/.*"])
+        filepaths = included_paths(hidden_tree, match=["*", "!**/.*"])
         assert filepaths == map_osp(["d1/f1", "f1"])
 
     def test_exclude_hidden_dirs(self):
-        self.mkdirs("root/d1")
-        self.mkdirs("root/.d2")
+        self.mkfiles(
+            {
+                "root/f1": b"",
+                "root/.f2": b"",
+                "root/d1/f1": b"",
+                "root/d1/.f2": b"",
+                "root/.d2/f1": b"",
+            }
+        )
         self.mkdirs("root/d1/.d1")
 
-        self.mkfile("root/f1")
-        self.mkfile("root/.f2")
-        self.mkfile("root/d1/f1")
-        self.mkfile("root/d1/.f2")
-        self.mkfile("root/.d2/f1")
-
         # no ignore
         filepaths = included_paths(self.path_to("root"), empty_dirs=True)
         assert filepaths == map_osp(
@@ -331,37 +341,30 @@ class TestGetIncludedPaths(TempDirTest):
         filepaths = included_paths(self.path_to("root"), match=["*", "!.*/"])
         assert filepaths == map_osp([".f2", "d1/.f2", "d1/f1", "f1"])
 
-    def test_exclude_hidden_dirs_and_files(self):
-        self.mkdirs("root/d1")
-        self.mkdirs("root/.d2")
-
-        self.mkfile("root/f1")
-        self.mkfile("root/.f2")
-        self.mkfile("root/d1/f1")
-        self.mkfile("root/d1/.f2")
-        self.mkfile("root/.d2/f1")
-
+    def test_exclude_hidden_dirs_and_files(self, hidden_tree):
         # no ignore
-        filepaths = included_paths(self.path_to("root"))
+        filepaths = included_paths(hidden_tree)
         assert filepaths == map_osp([".d2/f1", ".f2", "d1/.f2", "d1/f1", "f1"])
 
         # using ignore
-        filepaths = included_paths(self.path_to("root"), match=["*", "!.*/", "!.*"])
+        filepaths = included_paths(hidden_tree, match=["*", "!.*/", "!.*"])
         assert filepaths == map_osp(["d1/f1", "f1"])
 
     def test_exclude_extensions(self):
-        self.mkdirs("root/d1")
-
-        self.mkfile("root/f")
-        self.mkfile("root/f.txt")
-        self.mkfile("root/f.skip1")
-        self.mkfile("root/fskip1")
-        self.mkfile("root/f.skip2")
-        self.mkfile("root/f.skip1.txt")
-        self.mkfile("root/f.skip1.skip2")
-        self.mkfile("root/f.skip1skip2")
-        self.mkfile("root/d1/f.txt")
-        self.mkfile("root/d1/f.skip1")
+        self.mkfiles(
+            {
+                "root/f": b"",
+                "root/f.txt": b"",
+                "root/f.skip1": b"",
+                "root/fskip1": b"",
+                "root/f.skip2": b"",
+                "root/f.skip1.txt": b"",
+                "root/f.skip1.skip2": b"",
+                "root/f.skip1skip2": b"",
+                "root/d1/f.txt": b"",
+                "root/d1/f.skip1": b"",
+            }
+        )
 
         filepaths = included_paths(
             self.path_to("root"), match=["*", "!*.skip1", "!*.skip2"]
@@ -378,87 +381,122 @@ class TestGetIncludedPaths(TempDirTest):
         )
 
     def test_empty_dirs_include_vs_exclude(self):
-        self.mkdirs("root/d1")
+        root = self.path_to("root")
+        self.mkfiles({"root/d1/f": b"", "root/d3/d31/f": b""})
         self.mkdirs("root/d2")
-        self.mkdirs("root/d3/d31")
         self.mkdirs("root/d4/d41")
 
-        self.mkfile("root/d1/f")
-        self.mkfile("root/d3/d31/f")
-
-        filepaths = included_paths(self.path_to("root"), empty_dirs=False)
+        filepaths = included_paths(root, empty_dirs=False)
         assert filepaths == map_osp(["d1/f", "d3/d31/f"])
 
         # `include_empty=False` is default
-        filepaths = included_paths(self.path_to("root"))
+        filepaths = included_paths(root)
         assert filepaths == map_osp(["d1/f", "d3/d31/f"])
 
-        filepaths = included_paths(self.path_to("root"), empty_dirs=True)
+        filepaths = included_paths(root, empty_dirs=True)
         assert filepaths == map_osp(["d1/f", "d2/.", "d3/d31/f", "d4/d41/."])
 
     def test_empty_dirs_because_of_filter_include_vs_exclude(self):
-        self.mkdirs("root/d1")
-        self.mkdirs("root/d2")
-
-        self.mkfile("root/d1/f")
-        self.mkfile("root/d2/.f")
+        root = self.path_to("root")
+        self.mkfiles({"root/d1/f": b"", "root/d2/.f": b""})
 
-        filepaths = included_paths(
-            self.path_to("root"), match=["*", "!.*"], empty_dirs=False
-        )
+        filepaths = included_paths(root, match=["*", "!.*"], empty_dirs=False)
         assert filepaths == map_osp(["d1/f"])
 
         # `include_empty=False` is default
         filepaths = included_paths(
-            self.path_to("root"),
+            root,
             match=["*", "!.*"],
         )
         assert filepaths == map_osp(["d1/f"])
 
-        filepaths = included_paths(
-            self.path_to("root"), match=["*", "!.*"], empty_dirs=True
-        )
+        filepaths = included_paths(root, match=["*", "!.*"], empty_dirs=True)
         assert filepaths == map_osp(["d1/f", "d2/."])
 
     def test_empty_dir_inclusion_not_affected_by_match(self):
+        root = self.path_to("root")
         self.mkdirs("root/d1")
         self.mkdirs("root/.d2")
 
         # NOTE that empty dirs are not excluded by match_patterns:
 
-        filepaths = included_paths(
-            self.path_to("root"), match=["*", "!.*"], empty_dirs=True
-        )
+        filepaths = included_paths(root, match=["*", "!.*"], empty_dirs=True)
         assert filepaths == map_osp([".d2/.", "d1/."])
 
-        filepaths = included_paths(
-            self.path_to("root"), match=["*", "!.*/"], empty_dirs=True
-        )
+        filepaths = included_paths(root, match=["*", "!.*/"], empty_dirs=True)
         assert filepaths == map_osp([".d2/.", "d1/."])
 
-        filepaths = included_paths(
-            self.path_to("root"), match=["*", "!d1"], empty_dirs=True
-        )
+        filepaths = included_paths(root, match=["*", "!d1"], empty_dirs=True)
         assert filepaths == map_osp([".d2/.", "d1/."])
 
 
-def dirhash_mp_comp(*args, **kwargs):
-    res = dirhash(*args, **kwargs)
-    res_mp = dirhash(*args, **{**kwargs, "jobs": 2})
+@pytest.fixture
+def process_pool():
+    """A pool of worker processes, shut down at the end of the test so that no
+    threads managing it are alive when other tests fork new processes."""
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+def _dirhash_mp_comp(directory, *args, executor, **kwargs):
+    res = dirhash(directory, *args, **kwargs)
+    res_mp = dirhash(directory, *args, executor=executor, **kwargs)
     assert res == res_mp
     return res
 
 
-class TestDirhash(TempDirTest):
-    def test_guaranteed_algorithms(self):
-        self.mkdirs("root/d1/d11")
-        self.mkdirs("root/d2")
-        self.mkfile("root/f1", "a")
-        self.mkfile("root/d1/f1", "b")
-        self.mkfile("root/d1/d11/f1", "c")
-        self.mkfile("root/d2/f1", "d")
+@pytest.fixture
+def dirhash_mp_comp(process_pool):
+    """Computes `dirhash` in the main process and checks that the result is the same
+    when hashing files in parallel (in a pool of worker processes shared by all
+    calls in the test).
+    """
+    return partial(_dirhash_mp_comp, executor=process_pool)
 
-        for algorithm, expected_hash in [
+
+@pytest.fixture(scope="module")
+def guaranteed_algorithms_tree(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("guaranteed_algorithms") / "root")
+    make_tree(root, {"f1": b"a", "d1/f1": b"b", "d1/d11/f1": b"c", "d2/f1": b"d"})
+
+    return root
+
+
+@pytest.fixture(scope="session")
+def numbers_blob():
+    # spans several chunks for all but the largest chunk size in `test_chunksize`
+    return "\n".join(str(i) for i in range(1000)).encode()
+
+
+@pytest.fixture(scope="module")
+def reference_hashes(tmp_path_factory):
+    """The sha256 dirhash of a directory with the files "a.txt" and "b.txt" (with
+    content "abc" and "def" respectively) for different `entry_properties`.
+    """
+    root = str(tmp_path_factory.mktemp("reference") / "root")
+    make_tree(root, {"a.txt": b"abc", "b.txt": b"def"})
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        return {
+            entry_properties: _dirhash_mp_comp(
+                root, "sha256", entry_properties=entry_properties, executor=executor
+            )
+            for entry_properties in [
+                ("name", "data"),
+                ("data",),
+                ("name",),
+                ("name", "data", "is_link"),
+                ("name", "is_link"),
+                ("data", "is_link"),
+            ]
+        }
+
+
+class TestDirhash(TempDirTest):
+    @pytest.mark.parametrize("jobs", [1, 2])
+    @pytest.mark.parametrize(
+        "algorithm, expected_hash",
+        [
             ("md5", "3c631c7f5771468a2187494f802fad8f"),
             ("sha1", "992aa2d00d2ed94f0c19eff7f151f5c6a7e0cc41"),
             ("sha224", "18013e1df933d5781b2eddb94aceeb7ab689643f1df24060fb478999"),
@@ -479,15 +517,24 @@ class TestDirhash(TempDirTest):
                 "0ec654d2bcebf5d60974f82ed820600d"
                 "8e807ea53d57578d076ec1c82f501208",
             ),
-        ]:
-            hash_value = dirhash_mp_comp(self.path_to("root"), algorithm)
-            assert hash_value == expected_hash
+        ],
+    )
+    def test_guaranteed_algorithms(
+        self, guaranteed_algorithms_tree, algorithm, expected_hash, jobs
+    ):
+        hash_value = dirhash(guaranteed_algorithms_tree, algorithm, jobs=jobs)
+        assert hash_value == expected_hash
+
+    def test_thread_pool_executor(self, guaranteed_algorithms_tree):
+        tree = guaranteed_algorithms_tree
+        expected_hash = dirhash(tree, "sha256")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            hash_value = dirhash(tree, "sha256", executor=executor)
+        assert hash_value == expected_hash
 
     def test_recursive_descriptor(self):
-        self.mkdirs("root/d1")
+        self.mkfiles({"root/f1": b"a", "root/d1/f12": b"b"})
         self.mkdirs("root/d2")
-        self.mkfile("root/f1", "a")
-        self.mkfile("root/d1/f12", "b")
 
         f1_desc = "data:a\000name:f1"
         f12_desc = "data:b\000name:f12"
@@ -505,15 +552,11 @@ class TestDirhash(TempDirTest):
         )
         assert empty_dirs_true == empty_dirs_true_expected
 
-    def test_symlinked_file(self):
-        self.mkdirs("root1")
-        self.mkfile("root1/f1", "a")
-        self.mkfile("linked_file", "b")
+    def test_symlinked_file(self, dirhash_mp_comp):
+        self.mkfiles({"root1/f1": b"a", "linked_file": b"b"})
         self.symlink("linked_file", "root1/f2")
 
-        self.mkdirs("root2")
-        self.mkfile("root2/f1", "a")
-        self.mkfile("root2/f2", "b")
+        self.mkfiles({"root2/f1": b"a", "root2/f2": b"b"})
 
         root1_linked_files_true = dirhash_mp_comp(
             self.path_to("root1"), algorithm="md5"
@@ -527,19 +570,11 @@ class TestDirhash(TempDirTest):
         assert root1_linked_files_false != root1_linked_files_true
         assert root1_linked_files_true == root2
 
-    def test_symlinked_dir(self):
-        self.mkdirs("root1")
-        self.mkfile("root1/f1", "a")
-        self.mkdirs("linked_dir")
-        self.mkfile("linked_dir/f1", "b")
-        self.mkfile("linked_dir/f2", "c")
+    def test_symlinked_dir(self, dirhash_mp_comp):
+        self.mkfiles({"root1/f1": b"a", "linked_dir/f1": b"b", "linked_dir/f2": b"c"})
         self.symlink("linked_dir", "root1/d1")
 
-        self.mkdirs("root2")
-        self.mkfile("root2/f1", "a")
-        self.mkdirs("root2/d1")
-        self.mkfile("root2/d1/f1", "b")
-        self.mkfile("root2/d1/f2", "c")
+        self.mkfiles({"root2/f1": b"a", "root2/d1/f1": b"b", "root2/d1/f2": b"c"})
 
         root1_linked_dirs_true = dirhash_mp_comp(
             self.path_to("root1"), algorithm="md5", linked_dirs=True
@@ -552,31 +587,28 @@ class TestDirhash(TempDirTest):
         assert root1_linked_dirs_false != root1_linked_dirs_true
         assert root1_linked_dirs_true == root2
 
-    def test_cache_used_for_symlinks(self):
+    def test_cache_used_for_symlinks(self, slow_hasher):
         self.mkdirs("root/dir")
-        self.mkfile("root/file", "< one chunk content")
+        self.mkfile("root/file", b"< one chunk content")
         for i in range(10):
             self.symlink("root/file", f"root/link_{i}")
         for i in range(10):
             self.symlink("root/file", f"root/dir/link_{i}")
-        start = time()
-        dirhash(self.path_to("root"), algorithm=SlowHasher)
-        end = time()
-        elapsed = end - start
-        assert elapsed < SlowHasher.wait_time * 2
+        dirhash(self.path_to("root"), algorithm=slow_hasher)
+        assert slow_hasher.num_updates == 1
 
-    def test_raise_on_empty_root_without_include_empty(self):
+    def test_raise_on_empty_root_without_include_empty(self, dirhash_mp_comp):
         self.mkdirs("root")
         with pytest.raises(ValueError):
             dirhash_mp_comp(self.path_to("root"), "sha256")
 
-    def test_empty_root_include_empty(self):
+    def test_empty_root_include_empty(self, dirhash_mp_comp):
         self.mkdirs("root")
         dirhash_ = dirhash_mp_comp(self.path_to("root"), "sha256", empty_dirs=True)
         expected_dirhash = hashlib.sha256(b"").hexdigest()
         assert dirhash_ == expected_dirhash
 
-    def test_include_empty(self):
+    def test_include_empty(self, dirhash_mp_comp):
         self.mkdirs("root/d1")
         self.mkdirs("root/d2")
         self.mkfile("root/d1/f")
@@ -586,195 +618,158 @@ class TestDirhash(TempDirTest):
         dirhash_empty = dirhash_mp_comp(*args, empty_dirs=True)
         assert dirhash_ != dirhash_empty
 
-    def test_chunksize(self):
+    @pytest.mark.parametrize("chunk_size", [2**4, 2**8, 2**16])
+    def test_chunksize(self, numbers_blob, chunk_size, dirhash_mp_comp):
         self.mkdirs("root")
-        self.mkfile("root/numbers.txt", str(range(1000)))
-
-        hash_value = dirhash_mp_comp(self.path_to("root"), "sha256")
-        for chunk_size in [2**4, 2**8, 2**16]:
-            assert (
-                dirhash_mp_comp(self.path_to("root"), "sha256", chunk_size=chunk_size)
-                == hash_value
-            )
+        self.mkfile("root/numbers.txt", numbers_blob)
+
+        filehash = hashlib.sha256(numbers_blob).hexdigest()
+        expected_hash = hashlib.sha256(
+            f"data:{filehash}\000name:numbers.txt".encode()
+        ).hexdigest()
+        hash_value = dirhash_mp_comp(
+            self.path_to("root"), "sha256", chunk_size=chunk_size
+        )
+        assert hash_value == expected_hash
 
-    def test_data_only(self):
-        self.mkdirs("root1")
-        self.mkfile("root1/a.txt", "abc")
-        self.mkfile("root1/b.txt", "def")
-        self.mkdirs("root2")
-        self.mkfile("root2/a.txt", "abc")
-        self.mkfile("root2/c.txt", "def")
+    def test_data_only(self, reference_hashes, dirhash_mp_comp):
+        self.mkfiles({"root2/a.txt": b"abc", "root2/c.txt": b"def"})
+        root2 = self.path_to("root2")
 
-        hash1 = dirhash_mp_comp(self.path_to("root1"), "sha256")
-        hash2 = dirhash_mp_comp(self.path_to("root2"), "sha256")
-        assert hash1 != hash2
+        hash2 = dirhash_mp_comp(root2, "sha256")
+        assert hash2 != reference_hashes[("name", "data")]
 
         # with entry hash remains the same as long as order of files is the
         # same
-        [dhash1, dhash2] = [
-            dirhash_mp_comp(self.path_to(root), "sha256", entry_properties=["data"])
-            for root in ["root1", "root2"]
-        ]
-        assert dhash1 == dhash2
+        dhash2 = dirhash_mp_comp(root2, "sha256", entry_properties=["data"])
+        assert dhash2 == reference_hashes[("data",)]
 
-    def test_name_only(self):
-        self.mkdirs("root1")
-        self.mkfile("root1/a.txt", "abc")
-        self.mkfile("root1/b.txt", "def")
-        self.mkdirs("root2")
-        self.mkfile("root2/a.txt", "abc")
-        self.mkfile("root2/b.txt", "___")
+    def test_name_only(self, reference_hashes, dirhash_mp_comp):
+        self.mkfiles({"root2/a.txt": b"abc", "root2/b.txt": b"___"})
+        root2 = self.path_to("root2")
 
-        hash1 = dirhash_mp_comp(self.path_to("root1"), "sha256")
-        hash2 = dirhash_mp_comp(self.path_to("root2"), "sha256")
-        assert hash1 != hash2
+        hash2 = dirhash_mp_comp(root2, "sha256")
+        assert hash2 != reference_hashes[("name", "data")]
 
-        [dhash1, dhash2] = [
-            dirhash_mp_comp(self.path_to(root), "sha256", entry_properties=["name"])
-            for root in ["root1", "root2"]
-        ]
-        assert dhash1 == dhash2
+        dhash2 = dirhash_mp_comp(root2, "sha256", entry_properties=["name"])
+        assert dhash2 == reference_hashes[("name",)]
 
-    def test_is_link_property(self):
-        self.mkdirs("root1")
-        self.mkfile("root1/a.txt", "abc")
-        self.mkfile("root1/b.txt", "def")
-        self.mkdirs("root2")
-        self.mkfile("b_target", "def")
-        self.mkfile("root2/a.txt", "abc")
+    def test_is_link_property(self, reference_hashes, dirhash_mp_comp):
+        self.mkfiles({"b_target": b"def", "root2/a.txt": b"abc"})
         self.symlink("b_target", "root2/b.txt")
+        root2 = self.path_to("root2")
 
-        hash1 = dirhash_mp_comp(self.path_to("root1"), "sha256")
-        hash2 = dirhash_mp_comp(self.path_to("root2"), "sha256")
-        assert hash1 == hash2
+        hash2 = dirhash_mp_comp(root2, "sha256")
+        assert hash2 == reference_hashes[("name", "data")]
 
         for entry_properties in [
-            ["name", "data", "is_link"],
-            ["name", "is_link"],
-            ["data", "is_link"],
+            ("name", "data", "is_link"),
+            ("name", "is_link"),
+            ("data", "is_link"),
         ]:
-            [hash1, hash2] = [
-                dirhash_mp_comp(
-                    self.path_to(root), "sha256", entry_properties=entry_properties
-                )
-                for root in ["root1", "root2"]
-            ]
-            assert hash1 != hash2
+            hash2 = dirhash_mp_comp(root2, "sha256", entry_properties=entry_properties)
+            assert hash2 != reference_hashes[entry_properties]
 
-    def test_raise_on_not_at_least_one_of_name_and_data(self):
+    def test_raise_on_not_at_least_one_of_name_and_data(self, dirhash_mp_comp):
+        root1 = self.path_to("root1")
         self.mkdirs("root1")
-        self.mkfile("root1/a.txt", "abc")
-        dirhash_mp_comp(self.path_to("root1"), "sha256")  # check ok
+        self.mkfile("root1/a.txt", b"abc")
+        dirhash_mp_comp(root1, "sha256")  # check ok
         with pytest.raises(ValueError):
-            dirhash_mp_comp(self.path_to("root1"), "sha256", entry_properties=[])
+            dirhash_mp_comp(root1, "sha256", entry_properties=[])
 
         with pytest.raises(ValueError):
-            dirhash_mp_comp(
-                self.path_to("root1"), "sha256", entry_properties=["is_link"]
-            )
+            dirhash_mp_comp(root1, "sha256", entry_properties=["is_link"])
 
+    @pytest.mark.slow
     @pytest.mark.skipif(
         os.name == "nt",
         reason="TODO: not getting expected speedup on Windows.",
         # TODO: see https://github.com/andhus/scantree/issues/25
     )
-    def test_multiproc_speedup(self):
+    def test_multiproc_speedup(self, slow_hasher):
         self.mkdirs("root/dir")
         num_files = 10
         for i in range(num_files):
-            self.mkfile(f"root/file_{i}", "< one chunk content")
+            self.mkfile(f"root/file_{i}", b"< one chunk content")
 
-        expected_min_elapsed_sequential = SlowHasher.wait_time * num_files
+        dirhash(self.path_to("root"), algorithm=slow_hasher)
+        assert slow_hasher.num_updates == num_files
+        assert slow_hasher.max_in_flight == 1
 
-        start = time()
-        dirhash(self.path_to("root"), algorithm=SlowHasher)
-        end = time()
-        elapsed_sequential = end - start
-        assert elapsed_sequential > expected_min_elapsed_sequential
+        slow_hasher.reset()
+        dirhash(self.path_to("root"), algorithm=slow_hasher, jobs=num_files)
+        assert slow_hasher.num_updates == num_files
+        assert slow_hasher.max_in_flight > 1
+        # just check "any concurrency", the overhead of starting the processes
+        # varies (and is high on CI)
 
-        start = time()
-        dirhash(self.path_to("root"), algorithm=SlowHasher, jobs=num_files)
-        end = time()
-        elapsed_muliproc = end - start
-        assert elapsed_muliproc < 0.9 * expected_min_elapsed_sequential
-        # just check "any speedup", the overhead varies (and is high on Travis)
+    @pytest.mark.slow
+    @pytest.mark.skipif(
+        multiprocessing.get_start_method() != "fork",
+        reason="starting (non-forked) worker processes takes too long to compare",
+    )
+    @pytest.mark.skipif((os.cpu_count() or 1) < 2, reason="requires multiple CPUs")
+    def test_multiproc_speedup_cpu_bound(self):
+        # about 1 s of work sequentially, forking the two worker processes takes a
+        # small fraction of that (the test is run serially, see tox.ini)
+        num_files = 4
+        self.mkfiles(
+            {f"root/file_{i}": b"< one chunk content" for i in range(num_files)}
+        )
+        root = self.path_to("root")
 
-    def test_cache_by_real_path_speedup(self, tmpdir):
+        start = perf_counter_ns()
+        dirhash(root, algorithm=BusyHasher)
+        elapsed_sequential = (perf_counter_ns() - start) / 1e9
+
+        start = perf_counter_ns()
+        dirhash(root, algorithm=BusyHasher, jobs=2)
+        elapsed_multiproc = (perf_counter_ns() - start) / 1e9
+        assert elapsed_multiproc < elapsed_sequential / 1.5
+
+    def test_cache_by_real_path(self, slow_hasher):
         num_links = 10
 
         # reference run without links
-        root1 = tmpdir.join("root1")
-        root1.ensure(dir=True)
-        for i in range(num_links):
-            file_i = root1.join(f"file_{i}")
-            file_i.write("< one chunk content", ensure=True)
-
-        wait_time = SlowHasher.wait_time
-        expected_min_elapsed_no_links = wait_time * num_links
-        start = time()
-        dirhash(root1, algorithm=SlowHasher)
-        end = time()
-        elapsed_no_links = end - start
-        assert elapsed_no_links > expected_min_elapsed_no_links
-        overhead = elapsed_no_links - expected_min_elapsed_no_links
+        self.mkfiles(
+            {f"root1/file_{i}": b"< one chunk content" for i in range(num_links)}
+        )
+        dirhash(self.path_to("root1"), algorithm=slow_hasher)
+        assert slow_hasher.num_updates == num_links
 
         # all links to same file
-        root2 = tmpdir.join("root2")
-        root2.ensure(dir=True)
-        target_file = tmpdir.join("target_file")
-        target_file.ensure()
+        self.mkdirs("root2")
+        self.mkfile("target_file", b"< one chunk content")
         for i in range(num_links):
-            os.symlink(target_file, root2.join(f"link_{i}"))
-
-        overhead_margin_factor = 1.5
-        expected_max_elapsed_with_links = overhead * overhead_margin_factor + wait_time
-        assert expected_max_elapsed_with_links < expected_min_elapsed_no_links
-        start = time()
-        dirhash(root2, algorithm=SlowHasher)
-        end = time()
-        elapsed_with_links = end - start
-        assert elapsed_with_links < expected_max_elapsed_with_links
-
-    def test_cache_together_with_multiprocess_speedup(self, tmpdir):
+            self.symlink("target_file", f"root2/link_{i}")
+
+        slow_hasher.reset()
+        dirhash(self.path_to("root2"), algorithm=slow_hasher)
+        assert slow_hasher.num_updates == 1
+
+    def test_cache_together_with_multiprocess(self, slow_hasher):
         target_file_names = ["target_file_1", "target_file_2"]
         num_links_per_file = 10
         num_links = num_links_per_file * len(target_file_names)
 
         # reference run without links
-        root1 = tmpdir.join("root1")
-        root1.ensure(dir=True)
-        for i in range(num_links):
-            file_i = root1.join(f"file_{i}")
-            file_i.write("< one chunk content", ensure=True)
-
+        self.mkfiles(
+            {f"root1/file_{i}": b"< one chunk content" for i in range(num_links)}
+        )
         jobs = 2
-        wait_time = SlowHasher.wait_time
-        expected_min_elapsed_no_links = wait_time * num_links / jobs
-        start = time()
-        dirhash(root1, algorithm=SlowHasher, jobs=jobs)
-        end = time()
-        elapsed_no_links = end - start
-        assert elapsed_no_links > expected_min_elapsed_no_links
-        overhead = elapsed_no_links - expected_min_elapsed_no_links
-
-        root2 = tmpdir.join("root2")
-        root2.ensure(dir=True)
+        dirhash(self.path_to("root1"), algorithm=slow_hasher, jobs=jobs)
+        assert slow_hasher.num_updates == num_links
+
+        self.mkdirs("root2")
+        self.mkfiles(dict.fromkeys(target_file_names, b"< one chunk content"))
         for i, target_file_name in enumerate(target_file_names):
-            target_file = tmpdir.join(target_file_name)
-            target_file.write("< one chunk content", ensure=True)
             for j in range(num_links_per_file):
-                os.symlink(target_file, root2.join(f"link_{i}_{j}"))
+                self.symlink(target_file_name, f"root2/link_{i}_{j}")
 
-        overhead_margin_factor = 1.5
-        expected_max_elapsed_with_links = (
-            overhead * overhead_margin_factor + wait_time * 2
-        )
-        assert expected_max_elapsed_with_links < expected_min_elapsed_no_links
-        start = time()
-        dirhash(root2, algorithm=SlowHasher, jobs=jobs)
-        end = time()
-        elapsed_mp_with_links = end - start
-        assert elapsed_mp_with_links < expected_max_elapsed_with_links
+        slow_hasher.reset()
+        dirhash(self.path_to("root2"), algorithm=slow_hasher, jobs=jobs)
+        assert slow_hasher.num_updates == len(target_file_names)
 
     def test_hash_cyclic_link_to_root(self):
         self.mkdirs("root/d1")
@@ -788,17 +783,17 @@ class TestDirhash(TempDirTest):
 
     def test_pass_filtering_instance(self):
         self.mkdirs("root")
-        self.mkfile("root/f1", "")
+        self.mkfile("root/f1")
         dirhash_impl(self.path_to("root"), "sha256", filter_=Filter())
 
     def test_pass_protocol_instance(self):
         self.mkdirs("root")
-        self.mkfile("root/f1", "")
+        self.mkfile("root/f1")
         dirhash_impl(self.path_to("root"), "sha256", protocol=Protocol())
 
     def test_raise_on_wrong_type(self):
         self.mkdirs("root")
-        self.mkfile("root/f1", "")
+        self.mkfile("root/f1")
         with pytest.raises(TypeError):
             dirhash_impl(self.path_to("root"), "sha256", filter_="")
         with pytest.raises(TypeError):
@@ -806,28 +801,99 @@ class TestDirhash(TempDirTest):
 
 
 class SlowHasher:
-    wait_time = 0.25
+    wait_time = 0.05
 
-    def __init__(self, *args, **kwargs):
-        pass
+    def __init__(self, factory):
+        self.factory = factory
 
     def update(self, data):
         if data != b"":
+            self.factory._enter_update()
             sleep(self.wait_time)
+            self.factory._exit_update()
 
     def hexdigest(self):
         return ""
 
 
+class SlowHasherFactory:
+    """Factory of `SlowHasher`s (passed as `algorithm`) that counts the number of
+    (non-empty) updates and the max number of updates in progress at the same time.
+    The counters are kept in a `multiprocessing.Manager` so that they are shared
+    with the worker processes when `jobs > 1`.
+    """
+
+    def __init__(self, manager):
+        self._lock = manager.Lock()
+        self._num_updates = manager.Value("i", 0)
+        self._in_flight = manager.Value("i", 0)
+        self._max_in_flight = manager.Value("i", 0)
+
+    def __call__(self, *args, **kwargs):
+        return SlowHasher(self)
+
+    @property
+    def num_updates(self):
+        return self._num_updates.value
+
+    @property
+    def max_in_flight(self):
+        return self._max_in_flight.value
+
+    def reset(self):
+        with self._lock:
+            self._num_updates.value = 0
+            self._in_flight.value = 0
+            self._max_in_flight.value = 0
+
+    def _enter_update(self):
+        with self._lock:
+            self._num_updates.value += 1
+            self._in_flight.value += 1
+            self._max_in_flight.value = max(
+                self._max_in_flight.value, self._in_flight.value
+            )
+
+    def _exit_update(self):
+        with self._lock:
+            self._in_flight.value -= 1
+
+
+@pytest.fixture
+def slow_hasher():
+    with multiprocessing.Manager() as manager:
+        yield SlowHasherFactory(manager)
+
+
+class BusyHasher:
+    """Hasher that does a fixed amount of CPU work (in pure python) per update, about
+    0.25 s on a typical machine."""
+
+    num_iterations = 25 * 10**5
+
+    def __init__(self, *args, **kwargs):
+        self.state = 0
+
+    def update(self, data):
+        if data != b"":
+            state = self.state
+            for i in range(self.num_iterations):
+                state = (state * 31 + i) & 0xFFFFFFFF
+            self.state = state
+
+    def hexdigest(self):
+        return f"{self.state:08x}"
+
+
 class IdentityHasher:
     def __init__(self, initial_data=b""):
-        self.datas = [initial_data.decode("utf-8")]
+        self.datas = [initial_data]
 
     def update(self, data):
-        self.datas.append(data.decode("utf-8"))
+        self.datas.append(data)
 
     def hexdigest(self):
-        return "".join(self.datas)
+        return b"".join(self.datas).decode("utf-8")
 
 
 class TestProtocol:
@@ -848,3 +914,33 @@ def mock_func(x):
 def test_parmap(jobs):
     inputs = [1, 2, 3, 4]
     assert _parmap(mock_func, inputs, jobs=jobs) == [2, 4, 6, 8]
+
+
+def test_parmap_executor(process_pool):
+    inputs = [1, 2, 3, 4]
+    assert _parmap(mock_func, inputs, executor=process_pool) == [2, 4, 6, 8]
+
+
+class ChunksizeRecordingExecutor(ProcessPoolExecutor):
+    def map(self, fn, *iterables, chunksize=1, **kwargs):
+        self.chunksize = chunksize
+        return super().map(fn, *iterables, chunksize=chunksize, **kwargs)
+
+
+def get_pid(_):
+    return os.getpid()
+
+
+@pytest.mark.parametrize(
+    "num_inputs, expected_chunksize",
+    [(0, 1), (3, 1), (1000, 125), (1001, 126)],
+)
+def test_parmap_process_pool_chunksize(num_inputs, expected_chunksize):
+    inputs = range(num_inputs)
+    with ChunksizeRecordingExecutor(max_workers=2) as executor:
+        pids = _parmap(get_pid, iter(inputs), executor=executor)
+    assert executor.chunksize == expected_chunksize
+    assert len(pids) == num_inputs
+    # each chunk is processed by a single worker
+    for start in range(0, num_inputs, expected_chunksize):
+        assert len(set(pids[start : start + expected_chunksize])) == 1